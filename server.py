@@ -1,8 +1,9 @@
 # server.py — Repo Oracle (MCP stdio)
-import os, time, json, base64, re
-from typing import Dict, Any, List, Tuple, Optional
-from collections import OrderedDict
+import os, time, re, threading, functools
+from typing import Dict, Any, List, Tuple, Optional, Callable, Iterable, Hashable
+from concurrent.futures import ThreadPoolExecutor
 
+import orjson
 import requests
 from mcp.server.fastmcp import FastMCP
 
@@ -10,6 +11,10 @@ mcp = FastMCP("Repo Oracle")
 # Support GitHub.com and GitHub Enterprise via env var
 # e.g., set GITHUB_BASE="https://ghe.myco.com/api/v3"
 BASE = os.getenv("GITHUB_BASE", "https://api.github.com").rstrip("/")
+# GHE serves GraphQL at /api/graphql next to /api/v3; github.com at /graphql
+GRAPHQL_URL = (BASE[:-len("/v3")] if BASE.endswith("/api/v3") else BASE) + "/graphql"
+# Cap on concurrent in-flight GitHub requests (keeps us clear of secondary rate limits)
+MAX_WORKERS = 8
 
 # ------------------ Session memory ------------------
 SESSION = {"owner": None, "repo": None}
@@ -23,43 +28,101 @@ def _use_repo(owner: Optional[str], repo: Optional[str]) -> Tuple[str, str]:
 
 # ------------------ Tiny LRU cache ------------------
 class LRU:
-    def __init__(self, maxsize: int = 128):
+    def __init__(self, maxsize: int = 128, maxbytes: int = 32 * 1024 * 1024):
         self.maxsize = maxsize
-        self._d: "OrderedDict[str, Any]" = OrderedDict()
+        self.maxbytes = maxbytes  # one recursive tree can be many MB, so bound bytes too
+        self._d: Dict[Hashable, Any] = {}  # dicts keep insertion order: first key is the LRU
+        self._size: Dict[Hashable, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()  # shared by the fetch worker threads
 
-    def get(self, k: str):
-        if k in self._d:
-            self._d.move_to_end(k)
-            return self._d[k]
-        return None
+    def get(self, k: Hashable):
+        with self._lock:
+            if k in self._d:
+                v = self._d[k] = self._d.pop(k)
+                return v
+            return None
 
-    def set(self, k: str, v: Any):
-        self._d[k] = v
-        self._d.move_to_end(k)
-        if len(self._d) > self.maxsize:
-            self._d.popitem(last=False)
+    def set(self, k: Hashable, v: Any, nbytes: int = 0):
+        with self._lock:
+            if k in self._d:
+                del self._d[k]
+                self._bytes -= self._size.pop(k)
+            self._d[k] = v
+            self._size[k] = nbytes
+            self._bytes += nbytes
+            while self._d and (len(self._d) > self.maxsize or self._bytes > self.maxbytes):
+                k0 = next(iter(self._d))
+                del self._d[k0]
+                self._bytes -= self._size.pop(k0)
 
 CACHE = LRU(128)
 
-def _hdrs():
-    token = os.getenv("GITHUB_TOKEN", "")
-    return {
-        "Authorization": f"Bearer {token}" if token else "",
-        "Accept": "application/vnd.github+json",
-        "User-Agent": "repo-oracle"
-    }
+# The stdio process is long-lived and its env doesn't change: read the token once
+_TOKEN = os.getenv("GITHUB_TOKEN", "")
+_STATIC_HDRS = {
+    "Accept": "application/vnd.github+json",
+    "User-Agent": "repo-oracle",
+    **({"Authorization": f"Bearer {_TOKEN}"} if _TOKEN else {}),
+}
+
+# One pooled session: keep-alive connections are reused instead of a TLS handshake per call
+_SESSION = requests.Session()
+_SESSION.headers.update(_STATIC_HDRS)
+
+def _cache_key(path: str, params: Dict[str, Any], raw: bool = False) -> Tuple[str, Tuple[Tuple[str, Any], ...], bool]:
+    # params values are str/int/bool, so the sorted items tuple hashes as-is
+    return (path, tuple(sorted(params.items())), raw)
 
-def _cache_key(path: str, params: Dict[str, Any]) -> str:
-    return f"{path}?{json.dumps(params, sort_keys=True)}"
+_LAST_PAGE_RE = re.compile(r'<[^>]*[?&]page=(\d+)[^>]*>;\s*rel="last"')
 
-def _get(path: str, params: Dict[str, Any] = None, use_cache: bool = True):
+def _last_page(link: str) -> Optional[int]:
+    """Total page count from a Link header's rel="last" entry, if present."""
+    m = _LAST_PAGE_RE.search(link)
+    return int(m.group(1)) if m else None
+
+def _get(path: str, params: Dict[str, Any] = None, use_cache: bool = True, raw: bool = False):
+    """
+    GET with an LRU of {etag, data, link, last_page} entries. Cached entries are
+    revalidated with If-None-Match; a 304 costs no body and no rate limit. If that
+    revalidation fails, the cached copy is returned with "stale": True. Blobs are
+    addressed by SHA and never change, so those are served from cache as-is.
+    raw=True asks for the raw media type and returns the body as bytes.
+    """
     params = params or {}
-    key = _cache_key(path, params)
-    if use_cache:
-        hit = CACHE.get(key)
-        if hit is not None:
-            return {"data": hit, "from_cache": True}
-    r = requests.get(BASE + path, headers=_hdrs(), params=params, timeout=12)
+    key = _cache_key(path, params, raw)
+    headers = {}  # per-call extras only; the session carries _STATIC_HDRS
+    if raw:
+        headers["Accept"] = "application/vnd.github.raw"
+    hit = CACHE.get(key) if use_cache else None
+    if hit is not None:
+        if not hit["etag"] or "/git/blobs/" in path:
+            return {"data": hit["data"], "from_cache": True, "link": hit["link"],
+                    "last_page": hit["last_page"]}
+        headers["If-None-Match"] = hit["etag"]
+    try:
+        r = _SESSION.get(BASE + path, headers=headers, params=params, timeout=12)
+        if r.status_code == 403 and "rate limit" in r.text.lower() and hit is None:
+            # light retry on secondary rate limit (with a cached copy we just serve that)
+            time.sleep(2.0)
+            r = _SESSION.get(BASE + path, headers=headers, params=params, timeout=12)
+    except requests.RequestException:
+        if hit is None:
+            raise
+        r = None
+    if hit is not None and (r is None or (not r.ok and r.status_code != 304)):
+        # revalidation failed (network, 5xx, 429, rate limit): serve the stale copy
+        return {"data": hit["data"], "from_cache": True, "stale": True, "link": hit["link"],
+                "last_page": hit["last_page"]}
+    if r.status_code == 304 and hit is not None:
+        return {
+            "data": hit["data"],
+            "from_cache": True,
+            "revalidated": True,
+            "link": hit["link"],
+            "last_page": hit["last_page"],
+            "ratelimit": r.headers.get("X-RateLimit-Remaining", "")
+        }
     if not r.ok:
         return {
             "error": f"{r.status_code}: {r.text[:200]}",
@@ -67,54 +130,102 @@ def _get(path: str, params: Dict[str, Any] = None, use_cache: bool = True):
             "ratelimit-remaining": r.headers.get("X-RateLimit-Remaining", ""),
             "ratelimit-reset": r.headers.get("X-RateLimit-Reset", "")
         }
-    data = r.json()
+    data = r.content if raw else orjson.loads(r.content)
+    link = r.headers.get("Link", "")
+    last_page = _last_page(link)
     if use_cache:
-        CACHE.set(key, data)
+        CACHE.set(key, {"etag": r.headers.get("ETag"), "data": data, "link": link, "last_page": last_page},
+                  len(r.content))
     return {
         "data": data,
         "from_cache": False,
-        "link": r.headers.get("Link", ""),
+        "link": link,
+        "last_page": last_page,
         "ratelimit": r.headers.get("X-RateLimit-Remaining", "")
     }
 
+def _get_raw(path: str, params: Dict[str, Any] = None, use_cache: bool = True):
+    """File/blob body as bytes in "data" — skips the JSON envelope and base64 decode."""
+    return _get(path, params, use_cache, raw=True)
+
+def _graphql(query: str, variables: Dict[str, Any] = None) -> dict:
+    """POST a GraphQL v4 query; returns {"data": ...} or the same error shape as _get."""
+    try:
+        r = _SESSION.post(GRAPHQL_URL, json={"query": query, "variables": variables or {}}, timeout=12)
+    except requests.RequestException as e:
+        # timeouts/connection drops become a normal error so callers can fall back to REST
+        return {"error": f"{type(e).__name__}: {str(e)[:200]}", "path": "/graphql"}
+    if not r.ok:
+        return {
+            "error": f"{r.status_code}: {r.text[:200]}",
+            "path": "/graphql",
+            "ratelimit-remaining": r.headers.get("X-RateLimit-Remaining", ""),
+            "ratelimit-reset": r.headers.get("X-RateLimit-Reset", "")
+        }
+    body = orjson.loads(r.content)
+    if body.get("errors") and not body.get("data"):
+        return {"error": "; ".join(e.get("message", "") for e in body["errors"])[:200], "path": "/graphql"}
+    return {"data": body.get("data") or {}}
+
+def _pmap(fn: Callable[[Any], Any], items: Iterable[Any]) -> List[Any]:
+    """Run fn over items on a bounded thread pool; results keep input order."""
+    items = list(items)
+    if len(items) <= 1:
+        return [fn(i) for i in items]
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(items))) as pool:
+        return list(pool.map(fn, items))
+
+def _page_items(data: Any) -> List[Any]:
+    return data if isinstance(data, list) else data.get("items", [])
+
 def _get_all(path: str, params: Dict[str, Any] = None, max_pages: int = 5, sleep_s: float = 0.0):
     """
     Simple paginator for endpoints that return either a list or {items: []}.
-    Follows 'page' param up to max_pages; optional small sleep to be nice to the API.
-    Light retry on 403 secondary rate limit.
+    Fetches page 1, reads the page count from Link rel="last" and pulls the
+    remaining pages (up to max_pages) concurrently. Endpoints that only expose
+    rel="next" are followed page by page, with an optional small sleep.
+    Search endpoints also get total_count / incomplete_results from page 1.
     """
     params = params or {}
-    all_items, page = [], 1
-    while page <= max_pages:
-        res = _get(path, {**params, "page": page})
-        if "error" in res:
-            err = res["error"].lower()
-            if err.startswith("403:") and "rate limit" in err:
-                time.sleep(2.0)
-                res = _get(path, {**params, "page": page})
-                if "error" in res:
-                    return res
-            else:
-                return res
+    res = _get(path, {**params, "page": 1})
+    if "error" in res:
+        return res
+    all_items = list(_page_items(res["data"]))
+    out = {"data": all_items}
+    if isinstance(res["data"], dict):
+        out.update({k: res["data"][k] for k in ("total_count", "incomplete_results") if k in res["data"]})
+    link = res.get("link") or ""
+    if not all_items or 'rel="next"' not in link:
+        return out
 
-        data = res["data"]
-        if isinstance(data, list):
-            if not data:
-                break
-            all_items.extend(data)
-        else:
-            items = data.get("items", [])
+    if res.get("last_page"):
+        last = min(res["last_page"], max_pages)
+        # results come back in page order, so items stay ordered
+        pages = _pmap(lambda p: _get(path, {**params, "page": p}), range(2, last + 1))
+        for res in pages:
+            if "error" in res:
+                return res
+            items = _page_items(res["data"])
             if not items:
                 break
             all_items.extend(items)
+        return out
 
-        link = (res.get("link") or "")
-        if 'rel="next"' not in link:
-            break
-        page += 1
+    page = 2
+    while page <= max_pages:
         if sleep_s:
             time.sleep(sleep_s)
-    return {"data": all_items}
+        res = _get(path, {**params, "page": page})
+        if "error" in res:
+            return res
+        items = _page_items(res["data"])
+        if not items:
+            break
+        all_items.extend(items)
+        if 'rel="next"' not in (res.get("link") or ""):
+            break
+        page += 1
+    return out
 
 # ------------------ Tools ------------------
 @mcp.tool()
@@ -152,17 +263,34 @@ def list_issues(owner: str = "", repo: str = "", state: str = "open",
     } for i in clipped]
     return {"count": len(issues), "issues": issues, "truncated": len(items) > len(clipped)}
 
+_CONFIG_EXTS = frozenset({".yaml", ".yml", ".json"})
+# Above this many changed files we skip listing them (one /files page holds 100)
+_PR_FILES_LIMIT = 100
+
 @mcp.tool()
-def summarize_pr(number: int, owner: str = "", repo: str = "") -> dict:
-    """Summarize a PR: header/changes/risks/next_steps."""
+def summarize_pr(number: int, owner: str = "", repo: str = "", include_files: bool = True) -> dict:
+    """Summarize a PR: header/changes/risks/next_steps. include_files=False skips the file listing."""
     o, r = _use_repo(owner or None, repo or None)
     pr = _get(f"/repos/{o}/{r}/pulls/{number}", {})
     if "error" in pr:
         return pr
-    files = _get(f"/repos/{o}/{r}/pulls/{number}/files", {})
-    if "error" in files:
-        files = {"data": []}
     p = pr["data"]
+    changed_files = p.get("changed_files") or 0
+    # counts come from the PR header; the file list is only needed for names + config risk
+    filenames, has_config = None, False
+    if include_files and changed_files <= _PR_FILES_LIMIT:
+        files = _get(f"/repos/{o}/{r}/pulls/{number}/files", {"per_page": _PR_FILES_LIMIT})
+        if "error" in files:
+            files = {"data": []}
+        # one walk over the file list: collect names and spot config files together
+        filenames = []
+        for f in files["data"]:
+            fn = f.get("filename")
+            filenames.append(fn)
+            if not has_config and fn:
+                i = fn.rfind(".")
+                has_config = i >= 0 and fn[i:] in _CONFIG_EXTS
+    additions, deletions = p.get("additions"), p.get("deletions")
     header = {
         "title": p.get("title"),
         "author": (p.get("user") or {}).get("login"),
@@ -171,9 +299,9 @@ def summarize_pr(number: int, owner: str = "", repo: str = "") -> dict:
     }
     changes = {
         "files_changed": p.get("changed_files"),
-        "additions": p.get("additions"),
-        "deletions": p.get("deletions"),
-        "filenames": [f.get("filename") for f in files["data"]]
+        "additions": additions,
+        "deletions": deletions,
+        "filenames": filenames
     }
     # Heuristic risks
     risks: List[str] = []
@@ -181,9 +309,11 @@ def summarize_pr(number: int, owner: str = "", repo: str = "") -> dict:
         risks.append("Draft PR")
     if p.get("mergeable") is False:
         risks.append("Merge conflicts")
-    if (p.get("additions") or 0) + (p.get("deletions") or 0) > 1500:
+    if (additions or 0) + (deletions or 0) > 1500:
         risks.append("Large diff (>1500 LOC)")
-    if any(fn.endswith((".yaml", ".yml", ".json")) for fn in changes["filenames"] or []):
+    if changed_files > _PR_FILES_LIMIT:
+        risks.append(f"Large diff (>{_PR_FILES_LIMIT} files)")
+    if has_config:
         risks.append("Config changes included")
     # Next steps
     next_steps: List[str] = []
@@ -198,65 +328,187 @@ def summarize_pr(number: int, owner: str = "", repo: str = "") -> dict:
 
 _TEXT_EXTS = (".md",".txt",".py",".js",".ts",".tsx",".jsx",".java",".go",".rb",".rs",".cpp",".c",".cs",
               ".json",".yml",".yaml",".toml",".ini",".sh",".bat",".ps1")
-_TODO_RE = re.compile(r"(TODO|FIXME|HACK|NOTE)\b[:\- ]?(.*)", re.IGNORECASE)
+_TEXT_EXT_SET = frozenset(e.lstrip(".") for e in _TEXT_EXTS)
+_DEFAULT_TODO_PATHS = ("src", "app", ".")
+_TODO_TAGS = (b"todo", b"fixme", b"hack", b"note")
+# Runs over a whole file (bytes); each match spans from line start to line end
+_TODO_RE = re.compile(rb"^[^\n]*?(TODO|FIXME|HACK|NOTE)\b[:\- ]?([^\n]*)", re.IGNORECASE | re.MULTILINE)
+# Per-line str pattern: bytes \b is ASCII-only, so "TODOé" needs a Unicode-aware re-check
+_TODO_LINE_RE = re.compile(r"(TODO|FIXME|HACK|NOTE)\b[:\- ]?(.*)", re.IGNORECASE)
+
+def _todo_hit(text: bytes, m: "re.Match[bytes]") -> Optional[Tuple[str, str]]:
+    """(tag, text) for a _TODO_RE match, or None if the str pattern rejects the line."""
+    end = m.end(1)
+    if end < len(text) and text[end] >= 0x80:
+        line = m.group(0).decode("utf-8", errors="replace")
+        sm = _TODO_LINE_RE.search(line)
+        if not sm:
+            return None
+        return sm.group(1).upper(), sm.group(2).strip() or line.strip()
+    # decode before strip(): str.strip() also drops non-ASCII whitespace such as NBSP
+    return (m.group(1).upper().decode("ascii"),
+            m.group(2).decode("utf-8", errors="replace").strip()
+            or m.group(0).decode("utf-8", errors="replace").strip())
+
+@functools.lru_cache(maxsize=32)
+def _matcher_for(paths: Tuple[str, ...]) -> Tuple["re.Pattern[str]", frozenset]:
+    """Compiled path-prefix regex + text extension set for a find_todos `paths` filter."""
+    prefix_re = re.compile(
+        "^(?:" + "|".join(re.escape(p.rstrip("/")) + "(?:/|$)" for p in paths) + ")"
+    )
+    return prefix_re, _TEXT_EXT_SET
+
+_GRAPHQL_BATCH = 50
+
+def _blob_text_key(o: str, r: str, sha: str) -> Tuple[str, str, str, str]:
+    # GraphQL Blob.text is already decoded (lossy for non-UTF-8), so it must not
+    # share the raw-blob key that _get_raw uses for the exact bytes
+    return ("graphql-blob-text", o, r, sha)
+
+def _blob_texts(o: str, r: str, shas: List[str]) -> Dict[str, bytes]:
+    """
+    Blob bodies by SHA, for scanning. Cached blobs (raw bytes or GraphQL text) come
+    from the LRU; with a token the rest are pulled _GRAPHQL_BATCH at a time via
+    aliased GraphQL `object(oid:)` selections. Anything GraphQL can't return as
+    text (binary, truncated, failed) goes via REST.
+    """
+    out: Dict[str, bytes] = {}
+    todo = []
+    for sha in dict.fromkeys(shas):
+        hit = (CACHE.get(_cache_key(f"/repos/{o}/{r}/git/blobs/{sha}", {}, True))
+               or CACHE.get(_blob_text_key(o, r, sha)))
+        if hit is not None:
+            out[sha] = hit["data"]
+        else:
+            todo.append(sha)
+
+    if todo and _TOKEN:
+        def _batch(chunk: List[str]) -> dict:
+            decls = "".join(f", $s{i}: GitObjectID!" for i in range(len(chunk)))
+            sels = " ".join(f"f{i}: object(oid: $s{i}) {{ ... on Blob {{ text isTruncated }} }}"
+                            for i in range(len(chunk)))
+            query = f"query($owner: String!, $name: String!{decls}) {{ repository(owner: $owner, name: $name) {{ {sels} }} }}"
+            return _graphql(query, {"owner": o, "name": r, **{f"s{i}": sha for i, sha in enumerate(chunk)}})
+
+        chunks = [todo[i:i + _GRAPHQL_BATCH] for i in range(0, len(todo), _GRAPHQL_BATCH)]
+        for chunk, res in zip(chunks, _pmap(_batch, chunks)):
+            if "error" in res:
+                continue
+            repo_obj = res["data"].get("repository") or {}
+            for i, sha in enumerate(chunk):
+                blob = repo_obj.get(f"f{i}") or {}
+                if blob.get("text") is None or blob.get("isTruncated"):
+                    continue
+                text = out[sha] = blob["text"].encode("utf-8")
+                CACHE.set(_blob_text_key(o, r, sha), {"data": text}, len(text))
+        todo = [sha for sha in todo if sha not in out]
+
+    for sha, res in zip(todo, _pmap(lambda s: _get_raw(f"/repos/{o}/{r}/git/blobs/{s}", {}), todo)):
+        if "error" not in res:
+            out[sha] = res["data"]
+    return out
+
+# Code search allows ~10 requests/min; above this many per call, walk the tree instead
+_SEARCH_REQUEST_BUDGET = 4
+
+def _search_todo_hits(o: str, r: str, prefixes: Iterable[str], max_pages: int) -> Optional[Tuple[List[dict], bool]]:
+    """
+    Code-search hits for the TODO tags, one query per path prefix (as a path: qualifier).
+    Scopes run one after another (pages within a scope fan out) to stay within MAX_WORKERS.
+    Returns (items, complete) or None when search can't be trusted here: over the
+    request budget, an error (no token, GHE without code search) or no hits at all
+    (repo not indexed).
+    """
+    scopes = sorted({p.strip("/") for p in prefixes} - {"", "."})
+    if not scopes or len(scopes) * max_pages > _SEARCH_REQUEST_BUDGET:
+        return None
+    items, complete = [], True
+    for p in scopes:
+        res = _get_all("/search/code", {
+            "q": f"TODO OR FIXME OR HACK OR NOTE repo:{o}/{r} path:{p}", "per_page": 100
+        }, max_pages=max_pages)
+        if "error" in res:
+            return None
+        items.extend(res["data"])
+        if res.get("incomplete_results") or len(res["data"]) < res.get("total_count", 0):
+            complete = False
+    if not items:
+        return None
+    return items, complete
 
 @mcp.tool()
 def find_todos(paths: List[str] = None, ref: str = "", max_files: int = 120,
-               owner: str = "", repo: str = "") -> dict:
-    """Walk repo tree, fetch text files, scan lines for TODO/FIXME/HACK/NOTE."""
+               owner: str = "", repo: str = "", use_search: bool = True) -> dict:
+    """Shortlist files via code search (or walk the repo tree), fetch them, scan for TODO/FIXME/HACK/NOTE."""
     o, r = _use_repo(owner or None, repo or None)
+    prefix_re, ext_set = _matcher_for(tuple(sorted(set(paths or _DEFAULT_TODO_PATHS))))
+
+    def _wanted(path: str) -> bool:
+        # no dot means no extension (a file named "go" is not a .go file)
+        _, dot, ext = path.rpartition(".")
+        return bool(dot) and "/" not in ext and ext in ext_set and prefix_re.match(path) is not None
+
+    # Code search only indexes the default branch, so it is only used when no ref was asked for
+    search_ok = use_search and not ref
     # Resolve branch
     if not ref:
         repo_meta = _get(f"/repos/{o}/{r}", {})
         if "error" in repo_meta:
             return repo_meta
         ref = repo_meta["data"].get("default_branch", "main")
-    # Get tree
-    tree = _get(f"/repos/{o}/{r}/git/trees/{ref}", {"recursive": 1})
-    if "error" in tree:
-        return tree
-    wanted = set(paths or ["src", "app", "."])
-    blobs = [e for e in tree["data"].get("tree", []) if e.get("type") == "blob"]
 
-    def _wanted(path: str) -> bool:
-        return path.endswith(_TEXT_EXTS) and any(
-            path == p or path.startswith(p.rstrip("/") + "/") for p in wanted
-        )
+    # (path, sha) pairs; blobs are content-addressed so no ref is needed to fetch them
+    candidates, source = None, "tree"
+    if search_ok:
+        found = _search_todo_hits(o, r, paths or _DEFAULT_TODO_PATHS,
+                                  max_pages=min(10, max(1, -(-max_files // 100))))
+        if found is not None:
+            hits, complete = found
+            seen, wanted = set(), []
+            for i in hits:
+                path = i.get("path", "")
+                if path in seen or not _wanted(path):
+                    continue
+                seen.add(path)
+                wanted.append((path, i.get("sha", "")))
+            # a partial hit list is only good enough if it already overflows max_files
+            if complete or len(wanted) > max_files:
+                candidates, source = wanted, "search"
+    if candidates is None:
+        tree = _get(f"/repos/{o}/{r}/git/trees/{ref}", {"recursive": 1})
+        if "error" in tree:
+            return tree
+        blobs = [e for e in tree["data"].get("tree", []) if e.get("type") == "blob"]
+        candidates = [(e.get("path", ""), e.get("sha", "")) for e in blobs
+                      if _wanted(e.get("path", ""))]
+    # judge truncation on the full candidate list: failed fetches must not hide skipped files
+    truncated = len(candidates) > max_files
+    candidates = candidates[:max_files]
 
+    texts = _blob_texts(o, r, [sha for _, sha in candidates])
     todos, scanned = [], 0
-    for e in blobs:
-        if scanned >= max_files:
-            break
-        path = e.get("path", "")
-        if not _wanted(path):
-            continue
-        # fetch content
-        c = _get(f"/repos/{o}/{r}/contents/{path}", {"ref": ref})
-        if "error" in c:
-            continue
-        data = c["data"]
-        if isinstance(data, list):  # directory
-            continue
-        if data.get("encoding") != "base64":
-            continue
-        try:
-            text = base64.b64decode(data["content"]).decode("utf-8", errors="replace")
-        except Exception:
+    for path, sha in candidates:
+        text = texts.get(sha)
+        if text is None:
             continue
         scanned += 1
-        for idx, line in enumerate(text.splitlines(), start=1):
-            m = _TODO_RE.search(line)
-            if m:
-                todos.append({
-                    "file": path,
-                    "line": idx,
-                    "tag": m.group(1).upper(),
-                    "text": m.group(2).strip() or line.strip()
-                })
+        # memmem-based substring checks are far cheaper than the regex; skip tag-free files
+        low = text.lower()
+        if not any(t in low for t in _TODO_TAGS):
+            continue
+        # matches come in order, so only count newlines since the previous one
+        line, pos = 1, 0
+        for m in _TODO_RE.finditer(text):
+            line += text.count(b"\n", pos, m.start())
+            pos = m.start()
+            hit = _todo_hit(text, m)
+            if hit:
+                todos.append({"file": path, "line": line, "tag": hit[0], "text": hit[1]})
     note = None
-    if scanned >= max_files:
+    if truncated:
         note = "max_files limit reached; results truncated"
-    return {"count": len(todos), "ref": ref, "scanned_files": scanned, "todos": todos, "note": note}
+    return {"count": len(todos), "ref": ref, "source": source, "scanned_files": scanned,
+            "todos": todos, "note": note}
 
 @mcp.tool()
 def search(query: str, type: str = "issues", limit: int = 10,
@@ -308,9 +560,10 @@ def search(query: str, type: str = "issues", limit: int = 10,
 @mcp.tool()
 def health_check() -> dict:
     return {
-        "status": "ok" if os.getenv("GITHUB_TOKEN") else "degraded",
-        "has_token": bool(os.getenv("GITHUB_TOKEN")),
-        "cached_keys": len(CACHE._d)
+        "status": "ok" if _TOKEN else "degraded",
+        "has_token": bool(_TOKEN),
+        "cached_keys": len(CACHE._d),
+        "cached_bytes": CACHE._bytes
     }
 
 # ------------------ Entrypoint ------------------